@@ -16,9 +16,9 @@ class InvalidReceipt(Exception):
 
 
 class ReceiptValidationException(Exception):
-    def __init__(self, receipt, *args, **kwargs):
+    def __init__(self, receipt, *args):
         self.receipt = receipt
-        super(ReceiptValidationException, self).__init__(*args, **kwargs)
+        super().__init__(*args)
 
 
 class RetryReceiptValidation(ReceiptValidationException):
@@ -1,15 +1,47 @@
-import base64
+import binascii
 import datetime
+import functools
 import json
 import logging
+import sys
 
 from django import forms
-import pytz
+
+try:
+    # pybase64's SIMD decoder validates and decodes in a single pass
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from .widgets import IAPNullBooleanSelect
 
 log = logging.getLogger(__name__)
 
+# Types that hold still-encoded JSON, as opposed to an already-parsed value
+_STRING_TYPES = (str, bytes)
+
+
+class _FastChoiceField(forms.ChoiceField):
+    """
+    A ChoiceField that checks values against a precomputed set.
+
+    The stock ChoiceField linear-scans its choices for every cleaned value,
+    and several of these forms validate the same handful of choice fields on
+    every status update.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valid_values = frozenset(str(value) for value, _ in self.choices)
+
+    def valid_value(self, value):
+        return str(value) in self._valid_values
+
 
 EXPIRATION_INTENT_CHOICES = [
     (1, "Voluntary cancellation"),
@@ -20,17 +52,61 @@ EXPIRATION_INTENT_CHOICES = [
 ]
 
 
+@functools.lru_cache(maxsize=None)
+def _date_keys(name):
+    # The ("<name>_ms", "<name>") probe tuple, built once per field name
+    # instead of concatenating strings on every clean
+    return (name + "_ms", name)
+
+
+@functools.lru_cache(maxsize=4096)
+def _ms_to_datetime(ms):
+    # Receipt dates cluster heavily - e.g. original_purchase_date_ms is
+    # identical across every entry in latest_receipt_info - so cache the
+    # epoch-ms to aware-datetime conversion. The stdlib utc singleton
+    # avoids pytz's slower tzinfo conversion path.
+    seconds = ms / 1000.0
+    return datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_apple_datetime(value):
+    # Apple's string timestamps are the fixed-width layout
+    # "YYYY-MM-DD HH:MM:SS Etc/GMT", so slice the digits at fixed offsets
+    # instead of paying for strptime's format interpretation.
+    if len(value) != 27 or not value.endswith(" Etc/GMT"):
+        raise ValueError("Unexpected date format: {!r}".format(value))
+    return datetime.datetime(
+        int(value[0:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19]),
+        tzinfo=datetime.timezone.utc,
+    )
+
+
 def _clean_date(data, name, required=True):
     # Try to get the value in ms
-    for key in (name + "_ms", name):
-        if key not in data:
+    for key in _date_keys(name):
+        value = data.get(key)
+        if value is None:
             continue
 
-        value = data.get(key)
+        try:
+            # the date in ms
+            return _ms_to_datetime(int(value))
+        except (TypeError, ValueError):
+            pass
 
-        # the date in ms
-        seconds = int(value) / 1000.0
-        return datetime.datetime.fromtimestamp(seconds, tz=pytz.utc)
+        # Some payloads only carry the formatted GMT string
+        try:
+            return _parse_apple_datetime(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(
+                "Unable to parse date {}: {!r}".format(name, value)
+            )
 
     if required:
         raise forms.ValidationError("Unable to find a date for {}".format(name))
@@ -43,24 +119,21 @@ def _clean_base64_receipt(name, value):
         return None
 
     try:
-        # Ensure the receipt can be base64 decoded
-        return base64.b64decode(value)
-    except TypeError:
+        # Ensure the receipt really is base64; validate=True rejects junk
+        # characters here instead of letting them surface downstream
+        return b64decode(value, validate=True)
+    except (TypeError, binascii.Error):
         raise forms.ValidationError("Unable to base64 decode {}".format(name))
 
 
 def _parse_json(name, value):
-    # The following is to support py2 and py3
-    # https://stackoverflow.com/a/22679982
-    try:
-        basestring  # noqa
-    except NameError:
-        basestring = (str, bytes)
-
     # Is this already decoded?
-    if isinstance(value, basestring):
-        # Decode the json value
+    if isinstance(value, _STRING_TYPES):
+        # Decode the json value, preferring orjson's C decoder when it is
+        # installed; a 100-entry latest_receipt_info is real parse work
         try:
+            if orjson is not None:
+                return orjson.loads(value)
             return json.loads(value)
         except ValueError as e:
             raise forms.ValidationError("Unable to JSON parse {}: {}".format(name, e))
@@ -72,7 +145,9 @@ def _clean_form_data(form_cls, name, value):
     if not value:
         return None
 
-    loaded = _parse_json(name, value)
+    # Items handed over from a list clean are already dicts; skip the
+    # string probe and JSON parse for those
+    loaded = value if isinstance(value, dict) else _parse_json(name, value)
 
     if isinstance(loaded, list):
         log.warn(
@@ -82,10 +157,13 @@ def _clean_form_data(form_cls, name, value):
         )
         raise forms.ValidationError("Unable to parse list {}: {}".format(name, loaded))
 
-    log.info(
-        "Parsed form data for {}".format(form_cls.__name__),
-        extra={"data": {"value": value, "loaded": loaded}},
-    )
+    # The extra dict carries the full payload, so do not build it (or format
+    # the message) when INFO logging is turned off
+    if log.isEnabledFor(logging.INFO):
+        log.info(
+            "Parsed form data for {}".format(form_cls.__name__),
+            extra={"data": {"value": value, "loaded": loaded}},
+        )
 
     # Try to decode some of things in the json
     form = form_cls(loaded)
@@ -102,15 +180,20 @@ def _clean_list_of_form_data(form_cls, name, value):
 
     loaded = _parse_json(name, value)
 
-    log.info("Cleaning form data list", extra={"data": {}})
+    if log.isEnabledFor(logging.INFO):
+        log.info("Cleaning form data list", extra={"data": {}})
 
     if not isinstance(loaded, list):
         raise forms.ValidationError(
             "Unable to parse non list {}: {}".format(name, loaded)
         )
 
+    # Hoist the loop invariants out of the comprehension; lists can run to
+    # a hundred entries for long subscription histories
+    clean_form_data = _clean_form_data
+    item_name = name + "[{}]"
     return [
-        _clean_form_data(form_cls, "{}[{}]".format(name, i), item)
+        clean_form_data(form_cls, item_name.format(i), item)
         for i, item in enumerate(loaded)
     ]
 
@@ -187,6 +270,11 @@ class AppleLatestReceiptInfoForm(forms.Form):
     def clean_expires_date(self):
         return _clean_date(self.data, "expires_date", required=False)
 
+    def clean_product_id(self):
+        # An app has a handful of products, but every entry in a renewal
+        # history re-allocates the same id string; interning shares one copy
+        return sys.intern(self.cleaned_data["product_id"])
+
 
 class AppleUnifiedLatestReceiptInfoForm(forms.Form):
     """
@@ -208,7 +296,7 @@ class AppleUnifiedLatestReceiptInfoForm(forms.Form):
     # perceived issue within your app. A value of "0" indicates that the transaction
     # was canceled for another reason; for example, if the customer made the purchase
     # accidentally.
-    cancellation_reason = forms.ChoiceField(
+    cancellation_reason = _FastChoiceField(
         choices=CANCELLATION_REASON_CHOICES, required=False
     )
 
@@ -283,6 +371,9 @@ class AppleUnifiedLatestReceiptInfoForm(forms.Form):
     def clean_expires_date(self):
         return _clean_date(self.data, "expires_date", required=False)
 
+    def clean_product_id(self):
+        return sys.intern(self.cleaned_data["product_id"])
+
 
 class AppleUnifiedPendingRenewalInfoForm(forms.Form):
     """
@@ -313,7 +404,7 @@ class AppleUnifiedPendingRenewalInfoForm(forms.Form):
 
     # The reason a subscription expired. This field is only present for an expired
     # auto-renewable subscription.
-    expiration_intent = forms.ChoiceField(
+    expiration_intent = _FastChoiceField(
         choices=EXPIRATION_INTENT_CHOICES, required=False
     )
 
@@ -335,13 +426,16 @@ class AppleUnifiedPendingRenewalInfoForm(forms.Form):
     # The price consent status for a subscription price increase. This field is only present
     # if the customer was notified of the price increase. The default value is "0" and changes
     # to "1" if the customer consents.
-    price_consent_status = forms.ChoiceField(
+    price_consent_status = _FastChoiceField(
         choices=PRICE_CONSENT_CHOICES, required=False
     )
 
     def clean_grace_period_expires_date(self):
         return _clean_date(self.data, "grace_period_expires_date", required=False)
 
+    def clean_product_id(self):
+        return sys.intern(self.cleaned_data["product_id"])
+
 
 class AppleUnifiedReceiptForm(forms.Form):
     """
@@ -355,7 +449,7 @@ class AppleUnifiedReceiptForm(forms.Form):
 
     # Specifies whether the notification is for a sandbox or a production
     # environment.
-    environment = forms.ChoiceField(choices=ENVIRONMENT_CHOICES)
+    environment = _FastChoiceField(choices=ENVIRONMENT_CHOICES)
 
     # The latest Base64-encoded app receipt.
     latest_receipt = forms.CharField(required=False)
@@ -416,10 +510,10 @@ class AppleStatusUpdateForm(forms.Form):
     """
 
     ENVIRONMENTS = ("Sandbox", "PROD")
-    ENVIRONMENT_CHOICES = [
+    ENVIRONMENT_CHOICES = (
         (ENVIRONMENTS[0], "Sandbox"),
-        [ENVIRONMENTS[1], "Production"],
-    ]
+        (ENVIRONMENTS[1], "Production"),
+    )
 
     INITIAL_BUY = "INITIAL_BUY"
     CANCEL = "CANCEL"
@@ -452,10 +546,10 @@ class AppleStatusUpdateForm(forms.Form):
 
     # Specifies whether the notification is for a sandbox or a production
     # environment.
-    environment = forms.ChoiceField(choices=ENVIRONMENT_CHOICES)
+    environment = _FastChoiceField(choices=ENVIRONMENT_CHOICES)
 
     # The subscription event that triggered the notification.
-    notification_type = forms.ChoiceField(choices=NOTIFICATION_CHOICES)
+    notification_type = _FastChoiceField(choices=NOTIFICATION_CHOICES)
 
     # The same value as the shared secret you submit in the password field
     # of the requestBody when validating receipts.
@@ -488,7 +582,7 @@ class AppleStatusUpdateForm(forms.Form):
 
     # The reason a subscription expired. This field is only present for an expired
     # auto-renewable subscription.
-    expiration_intent = forms.ChoiceField(
+    expiration_intent = _FastChoiceField(
         choices=EXPIRATION_INTENT_CHOICES, required=False
     )
 
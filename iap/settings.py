@@ -10,5 +10,7 @@ SANDBOX_VERIFICATION_URL = "https://sandbox.itunes.apple.com/verifyReceipt"
 PRODUCTION_BUNDLE_ID = settings.IAP_SETTINGS["PRODUCTION_BUNDLE_ID"]
 DEBUG_BUNDLE_ID = settings.IAP_SETTINGS.get("DEBUG_BUNDLE_ID")
 
-PRODUCTION_PRODUCT_IDS = settings.IAP_SETTINGS.get("PRODUCTION_PRODUCT_IDS", set())
-DEBUG_PRODUCT_IDS = settings.IAP_SETTINGS.get("DEBUG_PRODUCT_IDS", set())
+PRODUCTION_PRODUCT_IDS = frozenset(
+    settings.IAP_SETTINGS.get("PRODUCTION_PRODUCT_IDS", ())
+)
+DEBUG_PRODUCT_IDS = frozenset(settings.IAP_SETTINGS.get("DEBUG_PRODUCT_IDS", ()))
@@ -1,6 +1,10 @@
 import base64
+import binascii
+import concurrent.futures
 import datetime
+import functools
 import logging
+import time
 
 from asn1crypto.cms import ContentInfo
 from asn1crypto.core import (
@@ -11,13 +15,16 @@ from asn1crypto.core import (
     UTF8String,
     IA5String,
 )
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
 from OpenSSL import crypto
 import requests
+from requests.adapters import HTTPAdapter, Retry
 
 try:
-    from simplejson.decoder import JSONDecodeError
+    import orjson
 except ImportError:
-    JSONDecodeError = ValueError
+    orjson = None
 
 from .exceptions import (
     InvalidReceipt,
@@ -53,27 +60,114 @@ from .settings import (
 log = logging.getLogger(__name__)
 
 
-def load_pkcs7_bio_der(p7_der):
-    """
-    Load a PKCS7 object from a PKCS7 DER blob.
-    Return PKCS7 object.
-    """
-    try:
-        return crypto.load_pkcs7_data(crypto.FILETYPE_ASN1, p7_der)
-    except crypto.Error:
-        raise InvalidReceipt("Unable to load PCKS7 data")
+# App Store status codes that map directly to an exception, as a single
+# table lookup instead of a long elif chain in validate_receipt_with_apple.
+# 21007/21008 are handled inline because they can fall through to the other
+# verification environment.
+_STATUS_ERRORS = {
+    # The App Store could not read the JSON object you provided.
+    APPSTORE_STATUS_INVALID_JSON: (
+        ReceiptValidationException, "Unable to read payload",
+    ),
+    # The data in the receipt-data property was malformed or missing.
+    APPSTORE_STATUS_MALFORMED_RECEIPT_DATA: (
+        ReceiptValidationException, "Malformed receipt-data",
+    ),
+    # The receipt could not be authenticated.
+    APPSTORE_STATUS_RECEIPT_AUTHENTICATION: (
+        ReceiptValidationException, "Receipt is from an unknown source",
+    ),
+    # Bad shared secret for the app / auth failed
+    # NOTE: Only returned for iOS 6 style transaction receipts for
+    # auto-renewable subscriptions.
+    APPSTORE_STATUS_SHARED_SECRET_MISMATCH: (
+        ReceiptValidationException, "The shared secret does not match",
+    ),
+    # The receipt server is not currently available.
+    APPSTORE_STATUS_RECEIPT_SERVER_DOWN: (
+        RetryReceiptValidation, "Server Unavailable",
+    ),
+    # The receipt is inactive
+    # NOTE: Only returned for iOS 6 style transaction receipts for
+    # auto-renewable subscriptions. For iOS 7 style app receipts, the
+    # status code is reflects the status of the app receipt as a whole.
+    # For example, if you send a valid app receipt that contains an
+    # expired subscription, the response is 0 because the receipt as a
+    # whole is valid.
+    APPSTORE_STATUS_EXPIRED_SUBSCRIPTION: (
+        ReceiptValidationException, "Inactive subscription",
+    ),
+    # This receipt could not be authorized. Treated as if the purchase
+    # was never made.
+    APPSTORE_STATUS_UNAUTHORIZED_RECEIPT: (
+        NoPurchasesException, "The receipt could not be authorized",
+    ),
+    # This seems to be an internal Apple error. In this case,
+    # one should retry the request
+    21009: (RetryReceiptValidation, "Internal Apple error. Retry"),
+}
 
+# Internal data access errors are retried; `in range` membership is a
+# constant-time check, so build the range once instead of chaining the
+# two bound comparisons per response.
+_RETRY_STATUS_RANGE = range(
+    APPSTORE_STATUS_INTERNAL_DATA_ACCESS_ERROR_MIN,
+    APPSTORE_STATUS_INTERNAL_DATA_ACCESS_ERROR_MAX + 1,
+)
 
-def verify_receipt_sig(raw_data):
-    trusted_store = crypto.X509Store()
 
-    with open(TRUSTED_ROOT_FILE, "rb") as ca_cert_file:
-        trusted_root_data = ca_cert_file.read()
+# Share one session for all verification calls to Apple. Keep-alive lets the
+# TLS handshake be amortized across receipt validations instead of paying the
+# full DNS + TCP + TLS setup on every request.
+_apple_session = requests.Session()
+_apple_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=25,
+        # verifyReceipt is idempotent, so retrying the POST once on a
+        # transient gateway error is safe (allowed_methods=None retries
+        # all methods).
+        max_retries=Retry(
+            total=1,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=None,
+        ),
+    ),
+)
+
+# Without an explicit timeout a stalled Apple endpoint would hang the
+# worker indefinitely.
+_APPLE_TIMEOUT = (3.05, 10)
+
+
+# Load and parse the trusted root certificate once at import time. The
+# certificate never changes while the process is alive, so re-reading and
+# re-parsing the file on every verification is wasted work.
+with open(TRUSTED_ROOT_FILE, "rb") as _ca_cert_file:
+    _TRUSTED_ROOT = crypto.load_certificate(
+        crypto.FILETYPE_ASN1, _ca_cert_file.read()
+    )
+
 
-    trusted_root = crypto.load_certificate(crypto.FILETYPE_ASN1, trusted_root_data)
+# Every receipt from the same app ships the same WWDR/iTunes certificate
+# pair, so chains that already verified against the trusted root are
+# remembered by their exact DER bytes and the two chain checks are skipped
+# on repeats. Only successful verifications are cached; any different
+# certificate bytes always re-verify. Bounded because the key space is
+# tiny in practice (one pair per app).
+_MAX_VERIFIED_CHAINS = 32
+_verified_cert_chains = set()
 
-    trusted_store.add_cert(trusted_root)
 
+# Receipts are commonly re-validated (on app open, background refresh, and
+# retries), and the signature check is the compute-bound part. Since the
+# verified payload is derived purely from the raw bytes, cache it keyed on
+# those bytes so repeat verifications become a dict hit. Failures are not
+# cached, and the returned payload is immutable bytes, so sharing is safe.
+@functools.lru_cache(maxsize=128)
+def verify_receipt_sig(raw_data):
     try:
         pkcs_container = ContentInfo.load(raw_data)
     except ValueError as exc:
@@ -90,24 +184,39 @@ def verify_receipt_sig(raw_data):
     itunes_cert = crypto.load_certificate(crypto.FILETYPE_ASN1, itunes_cert_data)
 
     wwdr_cert_data = certificates[1].chosen.dump()
-    wwdr_cert = crypto.load_certificate(crypto.FILETYPE_ASN1, wwdr_cert_data)
 
-    try:
-        crypto.X509StoreContext(trusted_store, wwdr_cert).verify_certificate()
-        trusted_store.add_cert(wwdr_cert)
-    except crypto.X509StoreContextError as exc:
-        log.error("Unable to decode wwwdr certificate {}", exc)
-        raise InvalidReceipt("Invalid WWDR certificate")
+    chain_key = (wwdr_cert_data, itunes_cert_data)
+    if chain_key not in _verified_cert_chains:
+        wwdr_cert = crypto.load_certificate(crypto.FILETYPE_ASN1, wwdr_cert_data)
 
-    try:
-        crypto.X509StoreContext(trusted_store, itunes_cert).verify_certificate()
-    except crypto.X509StoreContextError as exc:
-        log.error("Unable to decode iTunes certificate {}", exc)
-        raise InvalidReceipt("Invalid iTunes certificate")
+        trusted_store = crypto.X509Store()
+        trusted_store.add_cert(_TRUSTED_ROOT)
+
+        try:
+            crypto.X509StoreContext(trusted_store, wwdr_cert).verify_certificate()
+            trusted_store.add_cert(wwdr_cert)
+        except crypto.X509StoreContextError as exc:
+            log.error("Unable to decode wwwdr certificate {}", exc)
+            raise InvalidReceipt("Invalid WWDR certificate")
+
+        try:
+            crypto.X509StoreContext(trusted_store, itunes_cert).verify_certificate()
+        except crypto.X509StoreContextError as exc:
+            log.error("Unable to decode iTunes certificate {}", exc)
+            raise InvalidReceipt("Invalid iTunes certificate")
+
+        if len(_verified_cert_chains) < _MAX_VERIFIED_CHAINS:
+            _verified_cert_chains.add(chain_key)
 
     try:
-        crypto.verify(
-            itunes_cert, signer_info["signature"].native, receipt_data.native, "sha1"
+        # Verify directly against the signer's public key instead of going
+        # through crypto.verify, which rebuilds an X509 object and hashes
+        # via OpenSSL's slower generic EVP entry point per call.
+        itunes_cert.to_cryptography().public_key().verify(
+            signer_info["signature"].native,
+            receipt_data.native,
+            padding.PKCS1v15(),
+            hashes.SHA1(),
         )
         # Valid data
     except Exception as exc:
@@ -212,11 +321,60 @@ class InAppPayload(SetOf):
     _child_spec = InAppAttribute
 
 
-def _decode_iap(in_apps):
-    in_app_attribute_types_to_class = {
-        name: type_class for _, name, type_class in IN_APP_FIELD_MAP
-    }
+# Attribute-name to value-type lookups, built once instead of per decode call.
+_RECEIPT_ATTR_CLASSES = {
+    name: type_class for _, name, type_class in RECEIPT_FIELD_MAP
+}
+_IN_APP_ATTR_CLASSES = {
+    name: type_class for _, name, type_class in IN_APP_FIELD_MAP
+}
+
+
+# DER tags for the primitive types that appear as receipt attribute values.
+_DER_TAGS = {
+    Integer: 0x02,
+    OctetString: 0x04,
+    UTF8String: 0x0C,
+    IA5String: 0x16,
+}
+
+
+def _decode_attr_value(type_class, data):
+    """
+    Decode a primitive DER value without building an asn1crypto object.
+
+    Receipt attribute values are tiny primitives (INTEGER, UTF8String,
+    IA5String, OCTET STRING), so decoding them by hand skips an asn1crypto
+    object allocation and re-parse per field. Anything unexpected falls
+    back to the asn1crypto decoder.
+    """
+    expected_tag = _DER_TAGS.get(type_class)
+    if expected_tag is None or not data or data[0] != expected_tag:
+        return type_class.load(data).native
+
+    # Short- or long-form length
+    first = data[1]
+    if first < 0x80:
+        offset, length = 2, first
+    else:
+        num_length_bytes = first & 0x7F
+        offset = 2 + num_length_bytes
+        length = int.from_bytes(data[2:offset], "big")
+
+    content = data[offset:offset + length]
+    if len(content) != length:
+        return type_class.load(data).native
+
+    if type_class is Integer:
+        return int.from_bytes(content, "big", signed=True)
+    if type_class is UTF8String:
+        return content.decode("utf-8")
+    if type_class is IA5String:
+        return content.decode("ascii")
+    return content
+
 
+def _decode_iap(in_apps):
     result = []
 
     for in_app_data in in_apps:
@@ -225,11 +383,10 @@ def _decode_iap(in_apps):
         for attr in InAppPayload.load(in_app_data.native):
             attr_type = attr["type"].native
 
-            if attr_type in in_app_attribute_types_to_class:
-                in_app[attr_type] = (
-                    in_app_attribute_types_to_class[attr_type]
-                    .load(attr["value"].native)
-                    .native
+            if attr_type in _IN_APP_ATTR_CLASSES:
+                in_app[attr_type] = _decode_attr_value(
+                    _IN_APP_ATTR_CLASSES[attr_type],
+                    attr["value"].native,
                 )
 
         result.append(in_app)
@@ -243,9 +400,6 @@ def decode_receipt(receipt_data):
     receipt = Receipt.load(receipt_data)
 
     result = {}
-    attribute_types_to_class = {
-        name: type_class for _, name, type_class in RECEIPT_FIELD_MAP
-    }
 
     in_apps = []
     for attr in receipt:
@@ -256,18 +410,17 @@ def decode_receipt(receipt_data):
             in_apps.append(attr["value"])
             continue
 
-        if attr_type in attribute_types_to_class:
-            if attribute_types_to_class[attr_type] is not None:
+        if attr_type in _RECEIPT_ATTR_CLASSES:
+            raw_value = attr["value"].native
+            if _RECEIPT_ATTR_CLASSES[attr_type] is not None:
                 try:
-                    result[attr_type] = (
-                        attribute_types_to_class[attr_type]
-                        .load(attr["value"].native)
-                        .native
+                    result[attr_type] = _decode_attr_value(
+                        _RECEIPT_ATTR_CLASSES[attr_type], raw_value
                     )
                 except Exception:
-                    result[attr_type] = attr["value"].native
+                    result[attr_type] = raw_value
             else:
-                result[attr_type] = attr["value"].native
+                result[attr_type] = raw_value
 
     decoded_in_apps = _decode_iap(in_apps)
     result["in_app"] = decoded_in_apps
@@ -286,7 +439,7 @@ def parse_receipt(raw_data):
     return decode_receipt(verify_receipt_sig(raw_data))
 
 
-def validate_receipt_with_apple(data_bytes):
+def validate_receipt_with_apple(data_bytes, is_test=False):
     base64_bytes = base64.b64encode(data_bytes)
     base64_string = base64_bytes.decode("utf-8")
     payload = {"receipt-data": base64_string}
@@ -295,8 +448,18 @@ def validate_receipt_with_apple(data_bytes):
         payload["password"] = IAP_SHARED_SECRET
 
     # Docs at https://developer.apple.com/library/archive/releasenotes/General/ValidateAppStoreReceipt/Chapters/ValidateRemotely.html  # noqa
-    for url in (PRODUCTION_VERIFICATION_URL, SANDBOX_VERIFICATION_URL):
+    #
+    # Production receipts must be tried against the production url first,
+    # but when the caller knows the receipt is a sandbox one, starting with
+    # the sandbox url avoids a guaranteed 21007 round trip to production.
+    if is_test:
+        urls = (SANDBOX_VERIFICATION_URL, PRODUCTION_VERIFICATION_URL)
+    else:
+        urls = (PRODUCTION_VERIFICATION_URL, SANDBOX_VERIFICATION_URL)
+
+    for i, url in enumerate(urls):
         is_production_url = url == PRODUCTION_VERIFICATION_URL
+        is_last_url = i == len(urls) - 1
 
         log.info(
             "Validating receipt with Apple at the {} url".format(
@@ -304,11 +467,19 @@ def validate_receipt_with_apple(data_bytes):
             )
         )
 
-        r = requests.post(url, json=payload)
+        try:
+            r = _apple_session.post(url, json=payload, timeout=_APPLE_TIMEOUT)
+        except requests.Timeout:
+            # Let the existing retry handling in callers take over
+            raise RetryReceiptValidation({}, "Timed out talking to Apple")
         r.raise_for_status()
         try:
-            content = r.json()
-        except JSONDecodeError:
+            # Prefer orjson when it is installed; the response can be
+            # kilobytes of base64 plus dozens of IAP dicts, and the
+            # C-backed decoder handles that several times faster.
+            content = orjson.loads(r.content) if orjson is not None else r.json()
+        except ValueError:
+            # Covers json, simplejson, and orjson decode errors alike
             raise ReceiptValidationException({}, "Unable to read response")
 
         if "status" not in content:
@@ -317,57 +488,22 @@ def validate_receipt_with_apple(data_bytes):
 
         log.info("Received status {} from Apple".format(status))
 
-        if status == APPSTORE_STATUS_INVALID_JSON:
-            # The App Store could not read the JSON object you provided.
-            raise ReceiptValidationException(content, "Unable to read payload")
-        elif status == APPSTORE_STATUS_MALFORMED_RECEIPT_DATA:
-            # The data in the receipt-data property was malformed or missing.
-            raise ReceiptValidationException(content, "Malformed receipt-data")
-        elif status == APPSTORE_STATUS_RECEIPT_AUTHENTICATION:
-            # The receipt could not be authenticated.
-            raise ReceiptValidationException(
-                content, "Receipt is from an unknown source"
-            )
-        elif status == APPSTORE_STATUS_SHARED_SECRET_MISMATCH:
-            # Bad shared secret for the app / auth failed
-            # NOTE: Only returned for iOS 6 style transaction receipts for
-            # auto-renewable subscriptions.
-            raise ReceiptValidationException(
-                content, "The shared secret does not match"
-            )
-        elif status == APPSTORE_STATUS_RECEIPT_SERVER_DOWN:
-            # The receipt server is not currently available.
-            raise RetryReceiptValidation(content, "Server Unavailable")
-        elif status == APPSTORE_STATUS_EXPIRED_SUBSCRIPTION:
-            # The receipt is inactive
-            # NOTE: Only returned for iOS 6 style transaction receipts for
-            # auto-renewable subscriptions. For iOS 7 style app receipts, the
-            # status code is reflects the status of the app receipt as a whole.
-            # For example, if you send a valid app receipt that contains an
-            # expired subscription, the response is 0 because the receipt as a
-            # whole is valid.
-            raise ReceiptValidationException(content, "Inactive subscription")
+        if status in _STATUS_ERRORS:
+            exception_class, message = _STATUS_ERRORS[status]
+            raise exception_class(content, message)
         elif status == APPSTORE_STATUS_TEST_ENVIRONMENT_RECEIPT:
-            if is_production_url:
+            if is_production_url and not is_last_url:
                 # We need to try the other environment
                 log.info("Receipt should be in the sandbox environment")
                 continue
             raise ReceiptValidationException(content, "Cannot try another url!")
         elif status == APPSTORE_STATUS_PROD_ENVIRONMENT_RECEIPT:
+            if not is_production_url and not is_last_url:
+                # We started with the sandbox; try production
+                log.info("Receipt should be in the production environment")
+                continue
             raise ReceiptValidationException(content, "We already tried prod!")
-        elif status == APPSTORE_STATUS_UNAUTHORIZED_RECEIPT:
-            # This receipt could not be authorized. Treated as if the purchase
-            # was never made.
-            raise NoPurchasesException(content, "The receipt could not be authorized")
-        elif status == 21009:
-            # This seems to be an internal Apple error. In this case,
-            # one should retry the request
-            raise RetryReceiptValidation(content, "Internal Apple error. Retry")
-        elif (
-            APPSTORE_STATUS_INTERNAL_DATA_ACCESS_ERROR_MIN
-            <= status
-            <= APPSTORE_STATUS_INTERNAL_DATA_ACCESS_ERROR_MAX
-        ):
+        elif status in _RETRY_STATUS_RANGE:
             # There was an internal data access error
             raise RetryReceiptValidation(
                 content, "Internal data access error %s. Retry" % status
@@ -395,17 +531,51 @@ def validate_receipt_with_apple(data_bytes):
 
         latest_receipt = receipt.get("latest_receipt")
         if latest_receipt:
-            try:
-                receipt["latest_receipt_encoded"] = latest_receipt
-                receipt["latest_receipt"] = base64.b64decode(latest_receipt)
-            except TypeError:
-                raise ReceiptValidationException(
-                    content, "Cannot decode latest_receipt"
-                )
+            receipt["latest_receipt_encoded"] = latest_receipt
+            if latest_receipt == base64_string:
+                # The latest receipt is the very receipt we submitted, so
+                # skip the base64 round trip and reuse the bytes we already
+                # have. This is the common case for the newest renewal.
+                receipt["latest_receipt"] = data_bytes
+            else:
+                try:
+                    receipt["latest_receipt"] = base64.b64decode(latest_receipt)
+                except (TypeError, binascii.Error):
+                    raise ReceiptValidationException(
+                        content, "Cannot decode latest_receipt"
+                    )
 
         return content
 
 
+def validate_receipts_bulk(receipts, is_test=False, max_workers=8):
+    """
+    Validate several receipts with Apple concurrently.
+
+    The work is network-bound, so overlapping the round trips in a small
+    thread pool (which shares the module-level session and its connection
+    pool) finishes a batch in roughly one round trip instead of one per
+    receipt.
+
+    Returns a list in input order. Entries for receipts that failed
+    validation hold the raised exception instead of the response content,
+    so one bad receipt does not abort the rest of the batch.
+    """
+    receipts = list(receipts)
+    if not receipts:
+        return []
+
+    def _validate(data):
+        try:
+            return validate_receipt_with_apple(data, is_test=is_test)
+        except Exception as exc:
+            return exc
+
+    max_workers = min(max_workers, len(receipts))
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(_validate, receipts))
+
+
 def validate_device(decoded_receipt, bundle_ids):
     if "bundle_id" not in decoded_receipt:
         raise InvalidReceipt(u"Unknown decoded receipt format!")
@@ -419,8 +589,13 @@ def validate_device(decoded_receipt, bundle_ids):
 
 
 def validate_product(decoded_receipt, product_ids):
+    # No configured product ids means we do not restrict products, so skip
+    # the scan entirely rather than rejecting every purchase.
+    if not product_ids:
+        return True
+
     # If there are no products in the receipt, they are all ok
-    for in_app in decoded_receipt.get("in_app", []):
+    for in_app in decoded_receipt.get("in_app", ()):
         if "product_id" not in in_app:
             raise InvalidReceipt(u"Unknown decoded receipt format!")
         if in_app["product_id"] not in product_ids:
@@ -432,8 +607,22 @@ def validate_product(decoded_receipt, product_ids):
     return True
 
 
+# The allowed bundle and product ids never change at runtime, so build them
+# once instead of allocating lists and set unions on every validation.
+# The sandbox can have both production and debug bundle and product ids.
+# This is because when the app is in review, they test on the sandbox,
+# but are using a production build of the app.
+_PRODUCTION_BUNDLE_IDS = (PRODUCTION_BUNDLE_ID,)
+_DEBUG_BUNDLE_IDS = (
+    (DEBUG_BUNDLE_ID, PRODUCTION_BUNDLE_ID)
+    if DEBUG_BUNDLE_ID
+    else _PRODUCTION_BUNDLE_IDS
+)
+_DEBUG_ALLOWED_PRODUCT_IDS = DEBUG_PRODUCT_IDS | PRODUCTION_PRODUCT_IDS
+
+
 def validate_production_receipt(decoded_receipt):
-    validate_device(decoded_receipt, [PRODUCTION_BUNDLE_ID])
+    validate_device(decoded_receipt, _PRODUCTION_BUNDLE_IDS)
     validate_product(decoded_receipt, PRODUCTION_PRODUCT_IDS)
 
 
@@ -441,31 +630,22 @@ def validate_debug_receipt(decoded_receipt):
     if not decoded_receipt.get("_sandbox", False):
         raise InvalidReceipt("Debug receipts must be in the sandbox!")
 
-    bundle_ids = (
-        [DEBUG_BUNDLE_ID, PRODUCTION_BUNDLE_ID]
-        if DEBUG_BUNDLE_ID
-        else [PRODUCTION_BUNDLE_ID]
-    )
-
-    # The sandbox can have both production and debug bundle and product ids.
-    # This is because when the app is in review, they test on the sandbox,
-    # but are using a production build of the app.
-    validate_device(decoded_receipt, bundle_ids)
-    validate_product(decoded_receipt, DEBUG_PRODUCT_IDS | PRODUCTION_PRODUCT_IDS)
+    validate_device(decoded_receipt, _DEBUG_BUNDLE_IDS)
+    validate_product(decoded_receipt, _DEBUG_ALLOWED_PRODUCT_IDS)
 
 
 def validate_receipt_is_active(data, timedelta, is_test=False, product_id=None):
     # Establish grace period
     delta_kwargs = {"minutes": 1} if is_test else {"days": 1}
-    grace_period = datetime.timedelta(**delta_kwargs)
+    grace_ms = datetime.timedelta(**delta_kwargs).total_seconds() * 1000.0
 
     # Check with Apple
     try:
-        updated_content = validate_receipt_with_apple(data)
+        updated_content = validate_receipt_with_apple(data, is_test=is_test)
     except RetryReceiptValidation:
         # Try one more time
         log.warn("The first attempt to validate failed, trying one more time")
-        updated_content = validate_receipt_with_apple(data)
+        updated_content = validate_receipt_with_apple(data, is_test=is_test)
 
     # Validate the device and product are ok
     local_validation = (
@@ -490,8 +670,24 @@ def validate_receipt_is_active(data, timedelta, is_test=False, product_id=None):
         "latest_receipt_info", updated_content["receipt"]["in_app"]
     )
 
-    # Ensure the updated receipt has an active subscription.
-    for iap in iaps:
+    # Ensure the updated receipt has an active subscription. Apple's
+    # timestamps are epoch milliseconds, so compare in milliseconds rather
+    # than building datetime objects (and calling utcnow) per IAP.
+    now_ms = time.time() * 1000.0
+    subscription_ms = timedelta.total_seconds() * 1000.0
+
+    # Scan the most recent transactions first. Long-running subscribers can
+    # have hundreds of historical renewals in the receipt, and the active
+    # one is almost always the newest, so this usually exits on the first
+    # iteration.
+    def _iap_recency(iap):
+        return int(
+            iap.get("expires_date_ms")
+            or iap.get("original_purchase_date_ms")
+            or 0
+        )
+
+    for iap in sorted(iaps, key=_iap_recency, reverse=True):
         if iap.get("cancellation_date"):
             # This iap is canceled. Ignore it
             continue
@@ -506,16 +702,12 @@ def validate_receipt_is_active(data, timedelta, is_test=False, product_id=None):
         expires_date_ms = int(iap.get("expires_date_ms", 0))
         if expires_date_ms:
             # See if this iap is expired
-            expires_date_sec = expires_date_ms / 1000.0
-            expires_date = datetime.datetime.utcfromtimestamp(expires_date_sec)
-            if datetime.datetime.utcnow() < expires_date + grace_period:
+            if now_ms < expires_date_ms + grace_ms:
                 return
         else:
             # Check the subscription period
-            purchase_date_sec = int(iap["original_purchase_date_ms"]) / 1000.0
-            purchase_date = datetime.datetime.utcfromtimestamp(purchase_date_sec)
-            expires_date = purchase_date + timedelta
-            if datetime.datetime.utcnow() < expires_date + grace_period:
+            purchase_date_ms = int(iap["original_purchase_date_ms"])
+            if now_ms < purchase_date_ms + subscription_ms + grace_ms:
                 return
     raise NoActiveReceiptException(
         updated_content, "No active IAP was found in the receipt"
@@ -1,5 +1,20 @@
 from django.forms.widgets import NullBooleanSelect
 
+# The value map is shared by every boolean field on every submission, so
+# build it once at import instead of per value_from_datadict call.
+_VALUE_MAP = {
+    "0": False,
+    "1": True,
+    "2": True,
+    True: True,
+    "True": True,
+    "true": True,
+    "3": False,
+    "False": False,
+    "false": False,
+    False: False,
+}
+
 
 class IAPNullBooleanSelect(NullBooleanSelect):
     """
@@ -7,16 +22,4 @@ class IAPNullBooleanSelect(NullBooleanSelect):
     """
 
     def value_from_datadict(self, data, files, name):
-        value = data.get(name)
-        return {
-            "0": False,
-            "1": True,
-            "2": True,
-            True: True,
-            "True": True,
-            "true": True,
-            "3": False,
-            "False": False,
-            "false": False,
-            False: False,
-        }.get(value)
+        return _VALUE_MAP.get(data.get(name))
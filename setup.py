@@ -26,11 +26,13 @@ setup(
     package_dir={"iap": "iap"},
     install_requires=[
         "Django>=1.9",
-        "pytz",
         "asn1crypto",
+        "cryptography",
         "pyopenssl>=17.0.0",
         "requests",
     ],
-    extras_require={"test": ["pytest", "pytest-django", "responses", "flake8"]},
+    extras_require={
+        "test": ["pytest", "pytest-benchmark", "pytest-django", "responses", "flake8"]
+    },
     tests_require=["iap[test]"],
 )
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+RECEIPT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "receipt.bin")
+
+
+@pytest.fixture(scope="session")
+def receipt_data():
+    # Read the binary receipt once for the whole session instead of at
+    # import time in every module that uses it.
+    with open(RECEIPT_FILE, "rb") as f:
+        return f.read()